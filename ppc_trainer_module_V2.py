@@ -2,24 +2,48 @@
 
 import os
 import sys
+import re
 import json
 import random
-from collections import defaultdict
+import tempfile
+from collections import namedtuple
+from functools import lru_cache
+from itertools import accumulate, chain
 
 import streamlit as st
 
+try:
+    import orjson  # optionnel : lecture / écriture JSON plus rapide
+except ImportError:
+    orjson = None
+
 # =========================================================
 #  Constantes & utilitaires communs
 # =========================================================
 
 RANKS = ["A", "K", "Q", "J", "T", "9", "8", "7", "6", "5", "4", "3", "2"]
 
-POSITIONS_6MAX = ["LJ", "HJ", "CO", "BTN", "SB", "BB"]
-POSITIONS_8MAX = ["UTG", "UTG+1", "LJ", "HJ", "CO", "BTN", "SB", "BB"]
+# Chaînes internées : comparaisons / clés de dict par simple identité
+POSITIONS_6MAX = tuple(sys.intern(p) for p in ["LJ", "HJ", "CO", "BTN", "SB", "BB"])
+POSITIONS_8MAX = tuple(
+    sys.intern(p) for p in ["UTG", "UTG+1", "LJ", "HJ", "CO", "BTN", "SB", "BB"]
+)
+_POSITIONS = {"6-max": POSITIONS_6MAX, "8-max": POSITIONS_8MAX}
 
 STACKS = [100, 50, 25, 20, 19, 18, 17, 16, 15, 14, 13, 12, 11, 10]
 
-ACTIONS = ["fold", "open", "call", "threebet", "open_shove", "threebet_shove"]
+# Options des selectbox (construites une fois, pas à chaque rerun)
+POSITIONS_6MAX_CHOICES = ("Aléatoire",) + POSITIONS_6MAX
+POSITIONS_8MAX_CHOICES = ("Aléatoire",) + POSITIONS_8MAX
+STACK_CHOICES = ("Aléatoire",) + tuple(str(s) for s in STACKS)
+
+ACTIONS = tuple(
+    sys.intern(a)
+    for a in ["fold", "open", "call", "threebet", "open_shove", "threebet_shove"]
+)
+# Bit de chaque action : les réponses correctes d'un spot tiennent dans un entier
+ACTION_BIT = {act: 1 << i for i, act in enumerate(ACTIONS)}
+ALL_ACTIONS_MASK = (1 << len(ACTIONS)) - 1
 ACTION_LABELS = {
     "fold": "Fold",
     "open": "Open",
@@ -45,6 +69,11 @@ ACTION_EMOJI = {
     "threebet_shove": "⚫",
     "fold": "❌",
 }
+# libellés des boutons de réponse
+BUTTON_LABELS = {
+    act: f"{ACTION_EMOJI.get(act, '')} {ACTION_LABELS[act]}" for act in ACTIONS
+}
+BUTTON_KEYS = {act: f"btn_{act}" for act in ACTIONS}
 
 
 def base_dir():
@@ -65,6 +94,20 @@ def default_ranges_path() -> str:
     return os.path.join(base_dir(), "default_ranges.json")
 
 
+def _json_loads(raw: bytes):
+    """json.loads via orjson si disponible, sinon module json standard."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _json_dumps(obj) -> bytes:
+    """Sérialise en JSON compact (orjson si disponible) : fichiers lus par la machine."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
 def trainer_stats_path(username: str) -> str:
     """Chemin du fichier de stats / Leitner pour le trainer."""
     safe = "".join(c for c in username if c.isalnum() or c in ("_", "-"))
@@ -78,67 +121,165 @@ def canonical_hand_from_indices(i: int, j: int) -> str:
     - triangle supérieur : suited (AKs, AQs, ...)
     - triangle inférieur : offsuit (AKo, AQo, ...)
     """
-    r1 = RANKS[i]
-    r2 = RANKS[j]
     if i == j:
-        return r1 + r2
-    idx1 = RANKS.index(r1)
-    idx2 = RANKS.index(r2)
-    if idx1 < idx2:
-        hi, lo = r1, r2
-    else:
-        hi, lo = r2, r1
+        return RANKS[i] * 2
     if i < j:
-        return hi + lo + "s"
-    else:
-        return hi + lo + "o"
+        return RANKS[i] + RANKS[j] + "s"
+    return RANKS[j] + RANKS[i] + "o"
 
 
-# Ensemble de toutes les mains canoniques de la grille
-ALL_HANDS = {
-    canonical_hand_from_indices(i, j)
+# Table 13x13 des mains canoniques : _HAND_GRID[i][j]
+_HAND_GRID = tuple(
+    tuple(canonical_hand_from_indices(i, j) for j in range(len(RANKS)))
     for i in range(len(RANKS))
-    for j in range(len(RANKS))
-}
+)
 
 # Coordonnées (i, j) associées à chaque main canonique
-HAND_TO_COORD = {}
-for i in range(len(RANKS)):
-    for j in range(len(RANKS)):
-        h = canonical_hand_from_indices(i, j)
-        HAND_TO_COORD[h] = (i, j)
+HAND_TO_COORD = {
+    hand: (i, j) for i, row in enumerate(_HAND_GRID) for j, hand in enumerate(row)
+}
+
+# Ensemble de toutes les mains canoniques de la grille
+ALL_HANDS = frozenset(HAND_TO_COORD)
+
+# Version indexable (ordre déterministe) pour random.choice
+ALL_HANDS_TUPLE = tuple(sorted(ALL_HANDS))
+
+# Identifiant entier (0..168, ordre de la grille) de chaque main : une range
+# est représentée par un entier de 169 bits (bit HAND_ID[h] = main jouée)
+HAND_STR = tuple(HAND_TO_COORD)
+HAND_ID = {h: idx for idx, h in enumerate(HAND_STR)}
+# même table indexée en majuscules, pour les fichiers à la casse incertaine
+_HAND_ID_UPPER = {h.upper(): idx for h, idx in HAND_ID.items()}
+_CANONICAL_HAND = {h.upper(): h for h in HAND_STR}
+# bitmask de la grille complète
+_FULL_MASK = (1 << len(HAND_STR)) - 1
+
+
+def hands_to_mask(hands) -> int:
+    """Bitmask (entier 169 bits) d'une liste de mains ; mains inconnues ignorées."""
+    mask = 0
+    for h in hands:
+        idx = _HAND_ID_UPPER.get(h.upper())
+        if idx is not None:
+            mask |= 1 << idx
+    return mask
 
 
 # =========================================================
 #  Chargement des ranges (défaut + perso)
 # =========================================================
 
+def _normalize_spot_actions(spot: dict):
+    """
+    Pré-calcule, une fois au chargement, le bitmask des mains de chaque action
+    et celui des mains qui ne foldent pas, pour que evaluate_answer se limite
+    à un test de bit, ainsi qu'une version gelée (hashable) des actions
+    servant de clé de cache au rendu.
+    Les mains sont ramenées à leur écriture canonique (ex. "AKs") pour que le
+    rendu et la correction n'aient plus à normaliser la casse.
+    """
+    actions = spot.get("actions", {})
+    for act, hands in actions.items():
+        actions[act] = [_CANONICAL_HAND.get(h.upper(), h) for h in hands]
+    action_masks = {act: hands_to_mask(hands) for act, hands in actions.items()}
+    non_fold_mask = 0
+    for act, mask in action_masks.items():
+        if act != "fold":
+            non_fold_mask |= mask
+    spot["action_masks"] = action_masks
+    spot["non_fold_mask"] = non_fold_mask
+    spot["actions_key"] = frozenset(
+        (act, frozenset(hands)) for act, hands in actions.items()
+    )
+
+
 def load_ranges_file(path: str) -> dict:
     """
     Charge un fichier de ranges au format {version, spots}
     ou retourne {"version": 2, "spots": {}} en cas de souci.
+    Le résultat est mis en cache tant que le fichier n'est pas modifié.
     """
-    if not os.path.exists(path):
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
         return {"version": 2, "spots": {}}
+    return _load_ranges_cached(path, mtime)
+
+
+# Cache partagé par toutes les sessions : chaque sauvegarde de l'éditeur donne
+# un nouveau mtime, donc une nouvelle entrée ; on borne le nombre de copies.
+@st.cache_data(show_spinner=False, max_entries=32)
+def _load_ranges_cached(path: str, mtime: float) -> dict:
+    """
+    Version mise en cache de _read_ranges_file ; mtime ne sert qu'à invalider
+    le cache Streamlit quand le fichier change.
+    """
+    return _read_ranges_file(path)
+
+
+def _read_ranges_file(path: str) -> dict:
+    """Lecture effective du fichier de ranges, sans cache."""
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        if "spots" in data and isinstance(data["spots"], dict):
-            return data
-        # Cas rare : data est directement le dict de spots
-        if isinstance(data, dict) and any(
-            isinstance(v, dict) and "position" in v for v in data.values()
-        ):
-            return {"version": 2, "spots": data}
+        with open(path, "rb") as f:
+            data = _json_loads(f.read())
+        if not ("spots" in data and isinstance(data["spots"], dict)):
+            # Cas rare : data est directement le dict de spots
+            if isinstance(data, dict) and any(
+                isinstance(v, dict) and "position" in v for v in data.values()
+            ):
+                data = {"version": 2, "spots": data}
+            else:
+                return {"version": 2, "spots": {}}
+        # Un spot mal formé (action à null, main non textuelle...) est écarté
+        # seul, sans faire échouer le chargement du reste du fichier
+        invalid = []
+        for key, spot in data["spots"].items():
+            try:
+                _normalize_spot_actions(spot)
+            except Exception:
+                invalid.append(key)
+        for key in invalid:
+            del data["spots"][key]
+        return data
     except Exception:
         pass
     return {"version": 2, "spots": {}}
 
 
+def load_user_ranges(username: str, reload: bool = False) -> dict:
+    """
+    Ranges perso de l'utilisateur, mémorisées dans la session : on ne relit
+    (et ne recopie depuis le cache Streamlit) que si l'utilisateur ou la date
+    du fichier change. reload=True ("Recharger mes ranges") relit le fichier
+    sur disque en contournant les deux caches.
+    """
+    path = user_ranges_path(username)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+
+    cached = st.session_state.get("user_ranges_cache")
+    if not reload and cached is not None and cached[0] == (username, mtime):
+        return cached[1]
+
+    if reload and mtime is not None:
+        ranges = _read_ranges_file(path)
+    else:
+        ranges = load_ranges_file(path)
+    st.session_state.user_ranges_cache = ((username, mtime), ranges)
+    return ranges
+
+
 # =========================================================
 #  Stats / Leitner simplifié
 # =========================================================
 
+# SAVE_DURABLE=1 : fsync à chaque sauvegarde (sinon le cache OS absorbe l'écriture)
+SAVE_DURABLE = os.environ.get("SAVE_DURABLE") == "1"
+
+
 def load_trainer_stats(username: str) -> dict:
     """
     Charge les stats du trainer. Format :
@@ -153,9 +294,21 @@ def load_trainer_stats(username: str) -> dict:
     if not os.path.exists(path):
         return {"spots": {}, "total": {"success": 0, "fail": 0}}
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        with open(path, "rb") as f:
+            data = _json_loads(f.read())
         if "spots" in data and "total" in data:
+            # Complète une fois les anciens fichiers pour que update_stats
+            # n'ait plus à tester la présence des clés ; une entrée mal formée
+            # est écartée (ou remise à zéro) seule, sans perdre le reste
+            spots = data["spots"]
+            invalid = [k for k, counts in spots.items() if not isinstance(counts, dict)]
+            for key in invalid:
+                del spots[key]
+            if not isinstance(data["total"], dict):
+                data["total"] = {}
+            for counts in [data["total"], *spots.values()]:
+                counts.setdefault("success", 0)
+                counts.setdefault("fail", 0)
             return data
     except Exception:
         pass
@@ -163,17 +316,37 @@ def load_trainer_stats(username: str) -> dict:
 
 
 def save_trainer_stats(username: str, stats: dict):
+    """
+    Écriture atomique : fichier temporaire dans le même dossier puis
+    os.replace, pour ne jamais laisser un fichier de stats tronqué.
+    Le temporaire a un nom unique par appel : deux sessions du même profil
+    (deux onglets) ne peuvent pas écrire dans le même fichier.
+    """
     path = trainer_stats_path(username)
+    tmp = None
     try:
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(stats, f, indent=2)
+        fd, tmp = tempfile.mkstemp(
+            dir=os.path.dirname(path), prefix=os.path.basename(path), suffix=".tmp"
+        )
+        with os.fdopen(fd, "wb") as f:
+            f.write(_json_dumps(stats))
+            if SAVE_DURABLE:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
     except Exception:
-        pass
+        # pas de .tmp orphelin après un échec
+        if tmp is not None:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
 
 
 def update_stats(stats: dict, spot_key: str, success: bool):
-    spots = stats.setdefault("spots", {})
-    s = spots.setdefault(spot_key, {"success": 0, "fail": 0})
+    s = stats["spots"].get(spot_key)
+    if s is None:
+        s = stats["spots"][spot_key] = {"success": 0, "fail": 0}
     if success:
         s["success"] += 1
         stats["total"]["success"] += 1
@@ -206,45 +379,108 @@ def get_candidate_hands_for_spot(actions_for_spot: dict, max_distance: int = 2):
       dans la grille 13x13 de ces mains qui jouent.
     Si aucune main jouée n'est définie, renvoie ALL_HANDS (fallback).
     """
-    non_fold_hands = set()
-    for act, hands in actions_for_spot.items():
-        if act == "fold":
-            continue
-        for h in hands:
-            if h in ALL_HANDS:
-                non_fold_hands.add(h)
+    # Intersection faite en C avec le frozenset ALL_HANDS (mains inconnues écartées)
+    non_fold_hands = ALL_HANDS.intersection(
+        chain.from_iterable(
+            hands for act, hands in actions_for_spot.items() if act != "fold"
+        )
+    )
 
     if not non_fold_hands:
-        return set(ALL_HANDS)
+        return ALL_HANDS
 
-    candidates = set(non_fold_hands)
+    return _candidate_hands(non_fold_hands, max_distance)
 
-    for h in ALL_HANDS:
-        if h in non_fold_hands:
-            continue
-        if h not in HAND_TO_COORD:
-            continue
-        i, j = HAND_TO_COORD[h]
-        for played in non_fold_hands:
-            pi, pj = HAND_TO_COORD[played]
-            if max(abs(i - pi), abs(j - pj)) <= max_distance:
-                candidates.add(h)
-                break
 
-    return candidates
+@lru_cache(maxsize=None)
+def _neighborhood(hand: str, max_distance: int) -> frozenset:
+    """Mains à distance (Chebyshev) <= max_distance de `hand` dans la grille."""
+    i, j = HAND_TO_COORD[hand]
+    n = len(RANKS)
+    return frozenset(
+        _HAND_GRID[a][b]
+        for a in range(max(0, i - max_distance), min(n, i + max_distance + 1))
+        for b in range(max(0, j - max_distance), min(n, j + max_distance + 1))
+    )
 
 
-def draw_hand_for_spot(actions_for_spot: dict) -> str:
-    candidates = list(get_candidate_hands_for_spot(actions_for_spot))
-    if not candidates:
-        candidates = list(ALL_HANDS)
-    return random.choice(candidates)
+@lru_cache(maxsize=None)
+def _dilated_masks(max_distance: int) -> tuple:
+    """Bitmask du voisinage de chaque main, indexé par HAND_ID."""
+    return tuple(hands_to_mask(_neighborhood(h, max_distance)) for h in HAND_STR)
+
+
+@lru_cache(maxsize=1024)
+def _candidate_hands(non_fold_hands: frozenset, max_distance: int) -> frozenset:
+    """
+    Union des voisinages des mains jouées (mise en cache par range), calculée
+    par OR de bitmasks ; renvoie directement ALL_HANDS dès que la grille est pleine.
+    """
+    dilated = _dilated_masks(max_distance)
+    played = 0
+    for h in non_fold_hands:
+        played |= 1 << HAND_ID[h]
+
+    out = 0
+    while played:
+        low = played & -played
+        out |= dilated[low.bit_length() - 1]
+        if out == _FULL_MASK:
+            return ALL_HANDS
+        played ^= low
+    return frozenset(h for idx, h in enumerate(HAND_STR) if out >> idx & 1)
+
+
+@lru_cache(maxsize=4096)
+def _candidates_tuple(spot_key: str, actions_key: frozenset) -> tuple:
+    """Mains tirables pour un spot, calculées une fois par spot (actions gelées)."""
+    candidates = get_candidate_hands_for_spot(dict(actions_key))
+    if candidates is ALL_HANDS:
+        return ALL_HANDS_TUPLE
+    return tuple(sorted(candidates)) or ALL_HANDS_TUPLE
+
+
+def draw_hand_for_spot(spot_key: str, actions_key: frozenset) -> str:
+    return random.choice(_candidates_tuple(spot_key, actions_key))
 
 
 # =========================================================
 #  Sélection de spot en fonction filtres + Leitner
 # =========================================================
 
+@lru_cache(maxsize=4096)
+def _parse_spot_key(key: str):
+    """
+    Découpe une clé 'table_position_stack_scenario' en
+    (table_type, position, stack, scenario), ou None si la clé est invalide.
+    """
+    try:
+        ttype, pos, stack_str, scen = key.split("_", 3)
+        return ttype, pos, int(stack_str), scen
+    except ValueError:
+        return None
+
+
+# Champs des clés de spots rangés en tuples parallèles (un tuple par champ)
+SpotIndex = namedtuple("SpotIndex", "keys table_types positions stacks scenarios")
+
+
+@lru_cache(maxsize=16)
+def _spot_index(spot_keys: tuple) -> SpotIndex:
+    """
+    Construit, une fois par ensemble de clés, l'index en colonnes des spots
+    (les clés invalides sont ignorées).
+    """
+    rows = []
+    for key in spot_keys:
+        parsed = _parse_spot_key(key)
+        if parsed is not None:
+            rows.append((key,) + parsed)
+    if not rows:
+        return SpotIndex((), (), (), (), ())
+    return SpotIndex(*zip(*rows))
+
+
 def pick_spot_for_training(
     available_spot_keys,
     pos_choice: str,
@@ -252,7 +488,6 @@ def pick_spot_for_training(
     stats: dict,
     table_type_filter=None,
 ):
-    filtered = []
     stack_choice = None
     if stack_choice_label not in (None, "", "Aléatoire"):
         try:
@@ -260,13 +495,14 @@ def pick_spot_for_training(
         except ValueError:
             stack_choice = None
 
-    for key in available_spot_keys:
-        try:
-            ttype, pos, stack_str, scen = key.split("_", 3)
-            stack = int(stack_str)
-        except Exception:
-            continue
-
+    # Une seule passe : filtre + poids Leitner + sommes cumulées
+    filtered = []
+    cum_weights = []
+    total_w = 0.0
+    index = _spot_index(tuple(available_spot_keys))
+    for key, ttype, pos, stack in zip(
+        index.keys, index.table_types, index.positions, index.stacks
+    ):
         if table_type_filter and ttype != table_type_filter:
             continue
         if pos_choice not in (None, "", "Aléatoire") and pos != pos_choice:
@@ -275,98 +511,118 @@ def pick_spot_for_training(
             continue
 
         filtered.append(key)
+        total_w += get_spot_weight(stats, key)
+        cum_weights.append(total_w)
 
     if not filtered:
         filtered = list(available_spot_keys)
+        if not filtered:
+            return None
+        cum_weights = list(accumulate(get_spot_weight(stats, k) for k in filtered))
+        total_w = cum_weights[-1]
 
-    if not filtered:
-        return None
-
-    weights = [get_spot_weight(stats, k) for k in filtered]
-    total_w = sum(weights)
     if total_w <= 0:
         return random.choice(filtered)
 
-    r = random.uniform(0, total_w)
-    acc = 0.0
-    for k, w in zip(filtered, weights):
-        acc += w
-        if r <= acc:
-            return k
-    return filtered[-1]
+    # Tirage pondéré sur les sommes cumulées déjà calculées
+    return random.choices(filtered, cum_weights=cum_weights, k=1)[0]
 
 
 # =========================================================
 #  Rendu de la range de correction (grille HTML compacte)
 # =========================================================
 
+# Gabarits HTML de la grille, construits une fois au chargement du module
+_GRID_HEAD = (
+    "<div style='overflow-x:auto;max-width:100%;'>"
+    "<table style='border-collapse:collapse;font-size:9px;"
+    "text-align:center;margin:0 auto;table-layout:fixed;'>"
+    "<thead><tr><th style='padding:2px 4px;'></th>"
+    + "".join(f"<th style='padding:2px 4px;text-align:center;'>{r}</th>" for r in RANKS)
+    + "</tr></thead><tbody>"
+)
+_GRID_FOOT = "</tbody></table></div>"
+_ROW_HEAD_TPL = "<tr><th style='padding:2px 4px;text-align:center;'>{rank}</th>"
+_ROW_HEADS = tuple(_ROW_HEAD_TPL.format(rank=r) for r in RANKS)
+# Début commun des cellules <td> ; la case du héros y reçoit le surlignage
+_CELL_OPEN = "<td style='padding:1px;width:32px;height:32px;text-align:center;"
+_CELL_TPL = (
+    _CELL_OPEN + "'>"
+    "<div style='font-size:8px;line-height:1.1;"
+    "display:flex;flex-direction:column;align-items:center;"
+    "justify-content:center;height:100%;'>"
+    "<span style='display:inline-block;width:16px;height:16px;"
+    "border-radius:999px;background-color:{color};"
+    "border:1px solid #D1D5DB;'></span>"
+    "<span>{hand}</span>"
+    "</div></td>"
+)
+_HIGHLIGHT_STYLE = "background-color:#E5E7EB;border-radius:4px;"
+
+
 def render_correction_range_html(actions_for_spot: dict, hero_hand: str = None) -> str:
     """
     Grille 13x13 compacte, avec cellules carrées.
     """
-    hand_to_actions = defaultdict(set)
-    for act, hands in actions_for_spot.items():
+    actions_key = frozenset(
+        (act, frozenset(hands)) for act, hands in actions_for_spot.items()
+    )
+    return _correction_html(actions_key, hero_hand)
+
+
+def _correction_html(actions_key: frozenset, hero_hand: str = None) -> str:
+    """
+    Grille de correction à partir des actions gelées du spot : les cases sont
+    mises en cache par spot, seule celle du héros est remplacée avant
+    l'assemblage des lignes.
+    """
+    cells = _grid_cells(actions_key)
+    hero_id = HAND_ID.get(hero_hand)
+    if hero_id is not None:
+        cell = cells[hero_id]
+        cells = (
+            cells[:hero_id]
+            + (_CELL_OPEN + _HIGHLIGHT_STYLE + cell[len(_CELL_OPEN):],)
+            + cells[hero_id + 1:]
+        )
+    n = len(RANKS)
+    rows = "".join(
+        _row_html(row_head, cells[i * n:(i + 1) * n])
+        for i, row_head in enumerate(_ROW_HEADS)
+    )
+    return _GRID_HEAD + rows + _GRID_FOOT
+
+
+@lru_cache(maxsize=128)
+def _grid_cells(actions_key: frozenset) -> tuple:
+    """
+    HTML (<td>) de chaque case sans surlignage, dans l'ordre de la grille
+    (indexé par HAND_ID) ; seules les cases sont gardées en cache, pas la grille.
+    """
+    # Couleur de chaque main : celle de son action, gris si plusieurs actions
+    hand_to_color = {}
+    for act, hands in actions_key:
+        color = ACTION_COLORS.get(act, "#6B7280")
         for h in hands:
             if h in ALL_HANDS:
-                hand_to_actions[h].add(act)
-
-    html = []
-    html.append(
-        "<div style='overflow-x:auto;max-width:100%;'>"
-        "<table style='border-collapse:collapse;font-size:9px;"
-        "text-align:center;margin:0 auto;table-layout:fixed;'>"
-        "<thead><tr><th style='padding:2px 4px;'></th>"
+                hand_to_color[h] = "#6B7280" if h in hand_to_color else color
+
+    return tuple(
+        _CELL_TPL.format(color=hand_to_color.get(hand, "#FFFFFF"), hand=hand)
+        for hand in HAND_STR
     )
-    for r in RANKS:
-        html.append(
-            f"<th style='padding:2px 4px;text-align:center;'>{r}</th>"
-        )
-    html.append("</tr></thead><tbody>")
 
-    for i, r1 in enumerate(RANKS):
-        html.append("<tr>")
-        html.append(
-            f"<th style='padding:2px 4px;text-align:center;'>{r1}</th>"
-        )
-        for j, r2 in enumerate(RANKS):
-            hand = canonical_hand_from_indices(i, j)
-            acts = hand_to_actions.get(hand, set())
 
-            if not acts:
-                color = "#FFFFFF"
-            else:
-                if len(acts) == 1:
-                    act = list(acts)[0]
-                    color = ACTION_COLORS.get(act, "#6B7280")
-                else:
-                    color = "#6B7280"
-
-            highlight_style = ""
-            if hero_hand and hand.upper() == hero_hand.upper():
-                highlight_style = "background-color:#E5E7EB;border-radius:4px;"
-
-            cell = (
-                f"<td style='padding:1px;width:32px;height:32px;"
-                f"text-align:center;{highlight_style}'>"
-                "<div style='font-size:8px;line-height:1.1;"
-                "display:flex;flex-direction:column;align-items:center;"
-                "justify-content:center;height:100%;'>"
-                f"<span style='display:inline-block;width:16px;height:16px;"
-                f"border-radius:999px;background-color:{color};"
-                "border:1px solid #D1D5DB;'></span>"
-                f"<span>{hand}</span>"
-                "</div></td>"
-            )
-            html.append(cell)
-        html.append("</tr>")
-    html.append("</tbody></table></div>")
-    return "".join(html)
+def _row_html(row_head: str, row_cells: tuple) -> str:
+    """Une ligne <tr> de la grille, assemblée d'un seul join."""
+    return row_head + "".join(row_cells) + "</tr>"
 
 
 # =========================================================
 #  Affichage "gros" de la main
 # =========================================================
 
+@lru_cache(maxsize=512)
 def render_hand_big_html(hand: str) -> str:
     hand = hand.upper()
     r1 = hand[0]
@@ -391,27 +647,88 @@ def render_hand_big_html(hand: str) -> str:
     )
 
 
+# =========================================================
+#  Carte visuelle du spot
+# =========================================================
+
+# Gabarit HTML de la carte, construit une fois au chargement du module
+_CARD_TEMPLATE = (
+    "<div style='background:#F9FAFB;border-radius:20px;"
+    "padding:24px 32px;margin:8px 0 12px 0;border:1px solid #E5E7EB;'>"
+    "<div style='display:flex;justify-content:space-between;"
+    "align-items:center;flex-wrap:wrap;row-gap:4px;font-size:12px;"
+    "color:#6B7280;'>"
+    "<div>"
+    "Format : <b>{table_type}</b><br/>"
+    "Scénario brut : <code>{scenario}</code>"
+    "</div>"
+    "<div style='text-align:right;'>"
+    "Spot : <span style='font-family:monospace;'>{spot_key}</span>"
+    "</div>"
+    "</div>"
+    "<div style='margin-top:16px;display:flex;justify-content:space-around;"
+    "align-items:center;flex-wrap:wrap;row-gap:16px;'>"
+    "<div style='text-align:center;min-width:110px;'>"
+    "<div style='font-size:13px;color:#6B7280;'>Position</div>"
+    "<div style='font-size:28px;font-weight:600;color:#111827;'>{position}</div>"
+    "</div>"
+    "<div style='text-align:center;min-width:160px;'>"
+    "<div style='font-size:13px;color:#6B7280;'>Main</div>"
+    "{hand_html}"
+    "</div>"
+    "<div style='text-align:center;min-width:110px;'>"
+    "<div style='font-size:13px;color:#6B7280;'>Stack (BB)</div>"
+    "<div style='font-size:28px;font-weight:600;color:#111827;'>{stack}</div>"
+    "</div>"
+    "</div>"
+    "</div>"
+)
+
+
+@lru_cache(maxsize=1024)
+def _card_html(
+    table_type: str, position: str, stack, scenario: str, hand: str, spot_key: str
+) -> str:
+    """
+    Carte HTML du spot courant, mise en cache : elle ne change qu'avec le spot,
+    pas à chaque rerun Streamlit.
+    """
+    return _CARD_TEMPLATE.format(
+        table_type=table_type,
+        scenario=scenario,
+        spot_key=spot_key,
+        position=position,
+        hand_html=render_hand_big_html(hand),
+        stack=stack,
+    )
+
+
 # =========================================================
 #  Phrase lisible pour le scénario
 # =========================================================
 
+_SCENARIO_RE = re.compile(r"(?P<kind>open|libre)|vs_open_(?P<vil>.*)")
+
+
+@lru_cache(maxsize=512)
 def scenario_to_sentence(table_type: str, position: str, scenario: str) -> str:
     """
     Transforme 'open', 'vs_open_HJ', 'libre', etc. en phrase lisible.
     """
-    if scenario == "libre":
+    m = _SCENARIO_RE.fullmatch(scenario)
+    if m is None:
+        return f"Scénario : {scenario}"
+
+    kind = m.group("kind")
+    if kind == "libre":
         return "Mode libre : situation générique sans range de correction."
 
-    if scenario == "open":
+    if kind == "open":
         return f"Personne n'a parlé avant toi : tu es en {position} et tu peux ouvrir le pot."
 
-    if scenario.startswith("vs_open_"):
-        vil_pos = scenario.split("_", 2)[2]
-        return (
-            f"{vil_pos} a open avant toi : tu joues en {position} face à son open."
-        )
-
-    return f"Scénario : {scenario}"
+    return (
+        f"{m.group('vil')} a open avant toi : tu joues en {position} face à son open."
+    )
 
 
 # =========================================================
@@ -430,13 +747,8 @@ def new_spot_and_hand(
 ):
     # ----- Mode libre : pas de ranges -----
     if mode == "Entraînement libre":
-        if table_type == "6-max":
-            positions = POSITIONS_6MAX
-        else:
-            positions = POSITIONS_8MAX
-
         if pos_choice == "Aléatoire":
-            position = random.choice(positions)
+            position = random.choice(_POSITIONS.get(table_type, POSITIONS_8MAX))
         else:
             position = pos_choice
 
@@ -448,7 +760,7 @@ def new_spot_and_hand(
             except ValueError:
                 stack = random.choice(STACKS)
 
-        hand = random.choice(list(ALL_HANDS))
+        hand = random.choice(ALL_HANDS_TUPLE)
 
         return {
             "table_type": table_type,
@@ -456,8 +768,13 @@ def new_spot_and_hand(
             "stack": stack,
             "scenario": "libre",
             "hand": hand,
+            "hand_id": HAND_ID[hand],
             "spot_key": None,
             "actions_for_spot": None,
+            "action_masks": None,
+            "non_fold_mask": 0,
+            "actions_key": None,
+            "correct_mask": ALL_ACTIONS_MASK,
         }
 
     # ----- Mode avec ranges -----
@@ -471,7 +788,8 @@ def new_spot_and_hand(
     if not spots:
         return None
 
-    available_spot_keys = list(spots.keys())
+    # tuple : réutilisé tel quel (sans copie) comme clé du cache _spot_index
+    available_spot_keys = tuple(spots)
 
     spot_key = pick_spot_for_training(
         available_spot_keys,
@@ -485,21 +803,29 @@ def new_spot_and_hand(
         return None
 
     spot = spots[spot_key]
-    position = spot.get("position")
+    if "action_masks" not in spot:
+        _normalize_spot_actions(spot)
+    position = sys.intern(str(spot.get("position")))
     stack = spot.get("stack")
-    scenario = spot.get("scenario", "open")
+    scenario = sys.intern(str(spot.get("scenario", "open")))
     actions_for_spot = spot.get("actions", {})
 
-    hand = draw_hand_for_spot(actions_for_spot)
+    hand = draw_hand_for_spot(spot_key, spot["actions_key"])
 
+    hand_id = HAND_ID[hand]
     return {
         "table_type": table_type,
         "position": position,
         "stack": stack,
         "scenario": scenario,
         "hand": hand,
+        "hand_id": hand_id,
         "spot_key": spot_key,
         "actions_for_spot": actions_for_spot,
+        "action_masks": spot["action_masks"],
+        "non_fold_mask": spot["non_fold_mask"],
+        "actions_key": spot["actions_key"],
+        "correct_mask": correct_actions_mask(hand_id, spot),
     }
 
 
@@ -507,26 +833,33 @@ def new_spot_and_hand(
 #  Vérification de la réponse
 # =========================================================
 
-def evaluate_answer(hero_action: str, hero_hand: str, actions_for_spot: dict) -> bool:
-    if actions_for_spot is None:
+def evaluate_answer(hero_action: str, hand_id: int, spot: dict) -> bool:
+    """
+    hand_id : identifiant de la main du héros (HAND_ID) ;
+    spot : dict renvoyé par new_spot_and_hand.
+    """
+    action_masks = spot.get("action_masks")
+    if action_masks is None:
         # mode libre : tout est "correct"
         return True
 
-    non_fold_actions = [a for a in actions_for_spot.keys() if a != "fold"]
-    non_fold_hands = set()
-    for act in non_fold_actions:
-        for h in actions_for_spot.get(act, []):
-            non_fold_hands.add(h.upper())
+    bit = 1 << hand_id
+    if hero_action == "fold":
+        return not spot["non_fold_mask"] & bit
 
-    hero_hand_u = hero_hand.upper()
+    return bool(action_masks.get(hero_action, 0) & bit)
 
-    if hero_action == "fold":
-        return hero_hand_u not in non_fold_hands
 
-    allowed_hands = set(
-        h.upper() for h in actions_for_spot.get(hero_action, [])
-    )
-    return hero_hand_u in allowed_hands
+def correct_actions_mask(hand_id: int, spot: dict) -> int:
+    """
+    Masque (bits ACTION_BIT) des actions correctes pour la main du héros,
+    calculé une fois au tirage : la correction se réduit à un test de bit.
+    """
+    mask = 0
+    for act in ACTIONS:
+        if evaluate_answer(act, hand_id, spot):
+            mask |= ACTION_BIT[act]
+    return mask
 
 
 # =========================================================
@@ -552,10 +885,6 @@ def run_trainer(username: str):
     if "last_feedback" not in st.session_state:
         st.session_state.last_feedback = None
 
-    # ----------- Chargement des ranges -----------
-    default_ranges = load_ranges_file(default_ranges_path())
-    user_ranges = load_ranges_file(user_ranges_path(username))
-
     st.markdown(f"*Trainer – profil **{username}***")
     st.markdown("### 🧠 Poker Trainer – Ranges & Leitner")
 
@@ -583,20 +912,20 @@ def run_trainer(username: str):
         )
 
         if table_type == "6-max":
-            positions_list = POSITIONS_6MAX
+            position_choices = POSITIONS_6MAX_CHOICES
         else:
-            positions_list = POSITIONS_8MAX
+            position_choices = POSITIONS_8MAX_CHOICES
 
         pos_choice = st.selectbox(
             "Position (ou Aléatoire)",
-            ["Aléatoire"] + positions_list,
+            position_choices,
             index=0,
             key="trainer_pos_choice",
         )
 
         stack_choice_label = st.selectbox(
             "Stack (BB) (ou Aléatoire)",
-            ["Aléatoire"] + [str(s) for s in STACKS],
+            STACK_CHOICES,
             index=0,
             key="trainer_stack_choice",
         )
@@ -608,7 +937,15 @@ def run_trainer(username: str):
             key="trainer_ranges_source",
         )
 
+        # ----------- Chargement des ranges (mode correction uniquement) -----------
+        default_ranges = user_ranges = None
         if mode == "Avec ranges de correction":
+            reload_ranges = st.button(
+                "🔄 Recharger mes ranges", key="trainer_reload_ranges"
+            )
+            default_ranges = load_ranges_file(default_ranges_path())
+            user_ranges = load_user_ranges(username, reload=reload_ranges)
+
             if ranges_source == "Ranges personnelles":
                 if not user_ranges.get("spots"):
                     st.warning(
@@ -675,36 +1012,8 @@ def run_trainer(username: str):
         spot_key_s = spot.get("spot_key") or "libre"
 
         # ----- Carte visuelle -----
-        card_html = (
-            "<div style='background:#F9FAFB;border-radius:20px;"
-            "padding:24px 32px;margin:8px 0 12px 0;border:1px solid #E5E7EB;'>"
-            "<div style='display:flex;justify-content:space-between;"
-            "align-items:center;flex-wrap:wrap;row-gap:4px;font-size:12px;"
-            "color:#6B7280;'>"
-            "<div>"
-            f"Format : <b>{table_type_s}</b><br/>"
-            f"Scénario brut : <code>{scenario_s}</code>"
-            "</div>"
-            "<div style='text-align:right;'>"
-            f"Spot : <span style='font-family:monospace;'>{spot_key_s}</span>"
-            "</div>"
-            "</div>"
-            "<div style='margin-top:16px;display:flex;justify-content:space-around;"
-            "align-items:center;flex-wrap:wrap;row-gap:16px;'>"
-            "<div style='text-align:center;min-width:110px;'>"
-            "<div style='font-size:13px;color:#6B7280;'>Position</div>"
-            f"<div style='font-size:28px;font-weight:600;color:#111827;'>{position_s}</div>"
-            "</div>"
-            "<div style='text-align:center;min-width:160px;'>"
-            "<div style='font-size:13px;color:#6B7280;'>Main</div>"
-            f"{render_hand_big_html(hand_s)}"
-            "</div>"
-            "<div style='text-align:center;min-width:110px;'>"
-            "<div style='font-size:13px;color:#6B7280;'>Stack (BB)</div>"
-            f"<div style='font-size:28px;font-weight:600;color:#111827;'>{stack_s}</div>"
-            "</div>"
-            "</div>"
-            "</div>"
+        card_html = _card_html(
+            table_type_s, position_s, stack_s, scenario_s, hand_s, spot_key_s
         )
         st.markdown(card_html, unsafe_allow_html=True)
 
@@ -723,17 +1032,13 @@ def run_trainer(username: str):
         actions_row1 = ["fold", "open", "call"]
         actions_row2 = ["threebet", "open_shove", "threebet_shove"]
 
-        def button_label(act: str) -> str:
-            return f"{ACTION_EMOJI.get(act, '')} {ACTION_LABELS[act]}"
-
         def on_answer(action_key: str):
             current_spot = st.session_state.current_spot
             if not current_spot:
                 return
             hero_hand = current_spot["hand"]
-            actions_for_spot = current_spot.get("actions_for_spot")
 
-            correct = evaluate_answer(action_key, hero_hand, actions_for_spot)
+            correct = bool(current_spot["correct_mask"] & ACTION_BIT[action_key])
 
             stats = st.session_state.trainer_stats
             if (
@@ -769,17 +1074,27 @@ def run_trainer(username: str):
                     "message": msg,
                 }
 
+        # on_click : la réponse est traitée avant le rerun, donc les stats de la
+        # colonne de gauche et le feedback sont à jour dès ce passage
         c1, c2, c3 = st.columns(3)
         for col, act in zip((c1, c2, c3), actions_row1):
             with col:
-                if st.button(button_label(act), key=f"btn_{act}"):
-                    on_answer(act)
+                st.button(
+                    BUTTON_LABELS[act],
+                    key=BUTTON_KEYS[act],
+                    on_click=on_answer,
+                    args=(act,),
+                )
 
         c4, c5, c6 = st.columns(3)
         for col, act in zip((c4, c5, c6), actions_row2):
             with col:
-                if st.button(button_label(act), key=f"btn_{act}"):
-                    on_answer(act)
+                st.button(
+                    BUTTON_LABELS[act],
+                    key=BUTTON_KEYS[act],
+                    on_click=on_answer,
+                    args=(act,),
+                )
 
         fb = st.session_state.last_feedback
         if fb is not None:
@@ -794,11 +1109,8 @@ def run_trainer(username: str):
             if (
                 mode == "Avec ranges de correction"
                 and fb["correct"] is False
-                and spot.get("actions_for_spot")
+                and spot.get("actions_key")
             ):
                 st.markdown("#### 📚 Range de correction pour ce spot")
-                html_table = render_correction_range_html(
-                    spot["actions_for_spot"],
-                    hero_hand=spot["hand"],
-                )
+                html_table = _correction_html(spot["actions_key"], spot["hand"])
                 st.markdown(html_table, unsafe_allow_html=True)
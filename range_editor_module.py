@@ -3,10 +3,16 @@
 import os
 import sys
 import json
+import hashlib
 from collections import defaultdict
 
 import streamlit as st
 
+try:
+    import ijson  # optionnel : lecture en flux des gros fichiers de ranges
+except ImportError:
+    ijson = None
+
 # -----------------------------
 # Constantes poker
 # -----------------------------
@@ -37,6 +43,13 @@ ACTION_EMOJI = {
 }
 EMPTY_EMOJI = "⬜"
 
+# Préfixe emoji de chaque combinaison d'actions (dans l'ordre de ACTIONS),
+# calculé une fois pour éviter un tri par case de la grille à chaque rerun
+_EMOJI_PREFIX = {}
+for _mask in range(1, 1 << len(ACTIONS)):
+    _combo = [a for k, a in enumerate(ACTIONS) if (_mask >> k) & 1]
+    _EMOJI_PREFIX[frozenset(_combo)] = "".join(ACTION_EMOJI[a] for a in _combo)
+
 
 # -----------------------------
 # Utilitaires fichier
@@ -72,20 +85,11 @@ def canonical_hand_from_indices(i: int, j: int) -> str:
     - triangle inférieur : offsuit (AKo, AQo, ...)
     (comme dans la majorité des rangers : haut = suited, bas = off)
     """
-    r1 = RANKS[i]
-    r2 = RANKS[j]
     if i == j:
-        return r1 + r2
-    idx1 = RANKS.index(r1)
-    idx2 = RANKS.index(r2)
-    if idx1 < idx2:
-        hi, lo = r1, r2
-    else:
-        hi, lo = r2, r1
+        return RANKS[i] * 2
     if i < j:
-        return hi + lo + "s"   # triangle supérieur = suited
-    else:
-        return hi + lo + "o"   # triangle inférieur = offsuit
+        return RANKS[i] + RANKS[j] + "s"   # triangle supérieur = suited
+    return RANKS[j] + RANKS[i] + "o"       # triangle inférieur = offsuit
 
 
 def hand_weight(hand: str) -> int:
@@ -164,6 +168,25 @@ def spots_from_exported_data(data: dict) -> dict:
     return new_spots
 
 
+def load_exported_file(filelike) -> dict:
+    """
+    Lit un fichier de ranges exporté (fichier ouvert ou upload Streamlit).
+    Avec ijson, les spots sous la clé "spots" sont décodés au fil de la
+    lecture (le dict des spots reste, lui, entièrement construit en mémoire) ;
+    sinon, pour le format sans clé "spots" ou si ijson refuse le fichier
+    (BOM UTF-8 par ex.), on retombe sur json.load.
+    """
+    if ijson is not None:
+        try:
+            spots = dict(ijson.kvitems(filelike, "spots", use_float=True))
+        except ijson.JSONError:
+            spots = None
+        if spots:
+            return {"version": 2, "spots": spots}
+        filelike.seek(0)
+    return json.load(filelike)
+
+
 # -----------------------------
 # Callback pour un clic sur une main
 # -----------------------------
@@ -286,7 +309,7 @@ def run_range_editor(username: str):
     )
     if uploaded is not None:
         try:
-            data = json.load(uploaded)
+            data = load_exported_file(uploaded)
             new_spots = spots_from_exported_data(data)
             if not new_spots:
                 st.sidebar.error(
@@ -346,12 +369,19 @@ def run_range_editor(username: str):
     export_json = json.dumps(export_data, indent=2)
 
     # Sauvegarde automatique dans ranges_{username}.json
+    # (seulement si le contenu a changé depuis la dernière écriture)
     user_path = user_ranges_path(username)
-    try:
-        with open(user_path, "w", encoding="utf-8") as f:
-            f.write(export_json)
-    except Exception as e:
-        st.sidebar.warning(f"Impossible de sauvegarder le fichier utilisateur : {e}")
+    saved_hash = (
+        user_path,
+        hashlib.blake2b(export_json.encode("utf-8"), digest_size=16).digest(),
+    )
+    if st.session_state.get("last_saved_hash") != saved_hash:
+        try:
+            with open(user_path, "w", encoding="utf-8") as f:
+                f.write(export_json)
+            st.session_state.last_saved_hash = saved_hash
+        except Exception as e:
+            st.sidebar.warning(f"Impossible de sauvegarder le fichier utilisateur : {e}")
 
     st.sidebar.download_button(
         label="💾 Télécharger le fichier de ranges",
@@ -494,13 +524,11 @@ def run_range_editor(username: str):
         )
         for j, r2 in enumerate(RANKS):
             hand_code = canonical_hand_from_indices(i, j)
-            acts = hand_actions.get(hand_code, set())
+            acts = hand_actions.get(hand_code)
             if not acts:
                 prefix = EMPTY_EMOJI
             else:
-                prefix = "".join(
-                    ACTION_EMOJI[a] for a in sorted(acts) if a in ACTION_EMOJI
-                )
+                prefix = _EMOJI_PREFIX[frozenset(acts)]
             label = f"{prefix} {hand_code}"
 
             cols[j + 1].button(
@@ -549,25 +577,20 @@ def run_range_editor(username: str):
         scen = spot["scenario"]
         ha = spot.get("hand_actions", {})
 
-        combo_counts = defaultdict(int)
+        open_like = threebet_like = call_combos = fold_combos = 0
 
         for h in ALL_HANDS:
             w = hand_weight(h)
-            acts = ha.get(h, set())
+            acts = ha.get(h)
             if not acts:
-                combo_counts["fold"] += w
+                fold_combos += w
             else:
                 if "open" in acts or "open_shove" in acts:
-                    combo_counts["open_like"] += w
+                    open_like += w
                 if "threebet" in acts or "threebet_shove" in acts:
-                    combo_counts["threebet_like"] += w
+                    threebet_like += w
                 if "call" in acts:
-                    combo_counts["call"] += w
-
-        open_like = combo_counts["open_like"]
-        threebet_like = combo_counts["threebet_like"]
-        call_combos = combo_counts["call"]
-        fold_combos = combo_counts["fold"]
+                    call_combos += w
 
         open_pct = open_like / TOTAL_COMBOS * 100.0
         threebet_pct = threebet_like / TOTAL_COMBOS * 100.0